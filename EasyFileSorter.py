@@ -1,10 +1,37 @@
-import exifread
+import argparse
+import errno
 import logging
+import mmap
 import os
-import shutil
+import stat
+import struct
 import sys
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
-from optparse import OptionParser
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# EXIF tags holding creation date, in order of preference
+EXIF_DATE_TAGS = ("EXIF DateTimeOriginal", "Image DateTimeOriginal", "Image DateTime", "EXIF DateTimeDigitized")
+# TIFF tags holding creation date
+TIFF_TAG_DATETIME = 0x0132
+TIFF_TAG_DATETIME_ORIGINAL = 0x9003
+TIFF_TAG_DATETIME_DIGITIZED = 0x9004
+TIFF_TAG_EXIF_IFD = 0x8769
+TIFF_DATE_TAGS = {TIFF_TAG_DATETIME, TIFF_TAG_DATETIME_ORIGINAL, TIFF_TAG_DATETIME_DIGITIZED}
+# JPEG markers which are not followed by segment length
+JPEG_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+# Buffer size used when kernel copy functions are not available
+COPY_BUFFER_SIZE = 256 * 1024
+# Maximum number of bytes copied by single copy_file_range/sendfile call
+KERNEL_COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# Errors meaning that given kernel copy function cannot be used for given files
+_UNSUPPORTED_COPY_ERRNOS = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EBADF,
+                            errno.EOPNOTSUPP, getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+                            getattr(errno, "ENOTSOCK", errno.EINVAL)}
 
 
 class EFSError(Exception):
@@ -13,7 +40,8 @@ class EFSError(Exception):
 
 class EasyFileSorter(object):
 
-    def __init__(self, source_dir, destination_dir, remove_original_files=False, overwrite=False, use_exif=False):
+    def __init__(self, source_dir, destination_dir, remove_original_files=False, overwrite=False, use_exif=False,
+                 max_workers=None):
         """
         Creates EasyFileSorter object
 
@@ -22,68 +50,228 @@ class EasyFileSorter(object):
         :param remove_original_files: If remove_original_files=True files are removed from source directory
         (moved from source_dir to subdir in destination_dir), otherwise files are copied.
         :param overwrite: Indicates if in case of duplicated files names file should be overwritten
-        or copied with new name.
+        or copied with new name. Files which already exist in destination (with the same name, size
+        and modification time) are skipped in both cases - when moving, original file is left in place.
+        :param use_exif: Determine if date should be taken from EXIF
+        :param max_workers: Number of threads transferring files (default: min(32, 4 * number of CPUs))
         :raise EFSError if destination directory does not exist
         :rtype: EasyFileSorter
         :return: -
         """
-        logging.info("Initialise EasyFileSorter object")
+        logger.info("Initialise EasyFileSorter object")
         self._source_dir = source_dir
         self._destination_dir = destination_dir
         self._found_files = []
         self._remove_original_files = remove_original_files
         self._overwrite = overwrite
         self._use_exif = use_exif
+        self._max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        # Lock serialising creation of destination subdirectories and their locks
+        self._lock = threading.Lock()
+        # Locks serialising choice of unique file name per destination directory
+        self._directory_locks = {}
+        # Locks serialising writes to the same destination file in overwrite mode, with number of
+        # workers using them (lock is removed when no worker uses it)
+        self._path_locks = {}
+        # Names (casefolded) of files existing in or chosen for destination subdirectories
+        self._existing_names = {}
+        # Destination paths of files transferred (or being transferred) by this sorter
+        self._transferred_paths = set()
+        # Number of files not transferred, because the same file exists in destination subdirectory
+        self._skipped = 0
         if not os.path.isdir(self._source_dir):
             raise EFSError("{0} is not existing directory".format(self._source_dir))
+        # Moving within one filesystem is a rename, without copying file content
+        self._same_fs = _get_device(self._source_dir) == _get_device(self._destination_dir)
 
     def scan_directory(self, recursive=False):
         """
-        Looks for files self.source_dir directory
+        Looks for files self.source_dir directory. Files are found lazily, while they are transferred
+        by transfer_files, so scanning can be followed by single transfer only.
         :param recursive: If recursive=True then function is looking for files in source_dir an also in subdirectories.
         :return: -
         """
-        logging.info("Scan {0} directory (recursive?={1})".format(self._source_dir, recursive))
-        found_files = []
+        logger.info("Scan %s directory (recursive?=%s)", self._source_dir, recursive)
         if not os.path.isdir(self._source_dir):
             raise EFSError()
-        for root, directories, files in os.walk(self._source_dir):
-            for file_name in files:
-                found_files.append((root, file_name))
-                logging.info("File found: {0}".format(file_name))
-            if not recursive:
-                break
-        self._found_files = found_files
-        logging.info("{0} files found".format(len(self._found_files)))
+        self._found_files = self._iter_files(recursive)
+
+    def _iter_files(self, recursive):
+        """
+        Generator of files found in self.source_dir directory. Destination directory is skipped
+        if it is inside source directory, so transferred files are not found again.
+        :param recursive: If recursive=True then function is looking for files in source_dir an also in subdirectories.
+        :return: Found files (root, file name, DirEntry)
+        """
+        log_found_files = logger.isEnabledFor(logging.DEBUG)
+        destination_dir = os.path.normcase(os.path.abspath(self._destination_dir))
+        directories = deque([self._source_dir])
+        while directories:
+            root = directories.popleft()
+            try:
+                directory_iterator = os.scandir(root)
+            except OSError as e:
+                if root == self._source_dir:
+                    raise
+                # As os.walk does, skip subdirectories which cannot be listed
+                logger.warning("Unable to scan %s directory: %s", root, e)
+                continue
+            # Directory is read fully before files are yielded, as moving them changes the directory
+            # and readdir results are unspecified for directory modified while it is read
+            with directory_iterator:
+                entries = list(directory_iterator)
+            for entry in entries:
+                # DirEntry caches file type from readdir, so only symlinks need an extra stat here
+                if entry.is_file():
+                    if log_found_files:
+                        logger.debug("File found: %s", entry.name)
+                    yield root, entry.name, entry
+                elif recursive and entry.is_dir(follow_symlinks=False) \
+                        and os.path.normcase(os.path.abspath(entry.path)) != destination_dir:
+                    directories.append(entry.path)
 
     def transfer_files(self):
         """
         This function is transfering found files from source directory to subdirectories in destination directory
         :return: -
         """
-        for f in self._found_files:
-            original_file = os.path.join(f[0], f[1])
-            modification_date = self._get_date_from_file(original_file, self._use_exif)
-            year = str(modification_date.year)
-            month = modification_date.month
-            day = modification_date.day
-            new_path = os.path.join(self._destination_dir, year,
-                                    "{0}-{1:02d}".format(year, month),
-                                    "{0}-{1:02d}-{2:02d}".format(year, month, day))
-            if not os.path.isdir(new_path):
-                logging.info("Make new directory: {0}".format(new_path))
-                os.makedirs(new_path)
-            if not self._overwrite:
-                new_path = self._get_new_filename(destination_directory=new_path, filename=f[1])
-            if self._remove_original_files:
-                logging.info("Move {0} to {1}".format(original_file, new_path))
-                shutil.move(original_file, new_path)
-            else:
-                logging.info("Copy {0} to {1}".format(original_file, new_path))
-                shutil.copy2(original_file, new_path)
-        logging.info("All files transferred")
+        # Number of files submitted to workers, but not transferred yet, is limited, so files are
+        # found only as fast as they are transferred
+        max_pending = 2 * self._max_workers
+        transferred_files = 0
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            for f in self._found_files:
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                    transferred_files += len(done)
+                pending.add(executor.submit(self._sort_file, f))
+            for future in as_completed(pending):
+                future.result()
+            transferred_files += len(pending)
+        logger.info("All files transferred (%d files found, %d skipped as already transferred)",
+                    transferred_files, self._skipped)
+
+    def _sort_file(self, f):
+        """
+        Helper function to transfer single found file into destination subdirectory matching its date
+        :param f: Found file (root, file name, DirEntry)
+        :return: -
+        """
+        new_path = self._get_destination_directory(f)
+        if new_path not in self._directory_locks:
+            with self._lock:
+                if new_path not in self._directory_locks:
+                    self._make_directory(new_path)
+                    self._directory_locks[new_path] = threading.Lock()
+        self._transfer_file(f, new_path)
 
-    def _get_date_from_file(self, path_to_file, use_exif=True):
+    def _make_directory(self, path):
+        """
+        Helper function to create directory (with parents), without checking first if it exists.
+        It is called once per destination subdirectory, when its lock is created.
+        :param path: Full path to directory
+        :return: -
+        """
+        logger.info("Make new directory: %s", path)
+        os.makedirs(path, exist_ok=True)
+
+    def _get_destination_directory(self, f):
+        """
+        Helper function to get destination subdirectory for found file
+        :param f: Found file (root, file name, DirEntry)
+        :rtype String
+        :return: Full path to destination subdirectory
+        """
+        original_file = os.path.join(f[0], f[1])
+        modification_date = self._get_date_from_file(original_file, self._use_exif, f[2].stat().st_mtime_ns)
+        return _date_dir(self._destination_dir, modification_date.date())
+
+    def _transfer_file(self, f, new_path):
+        """
+        Helper function to transfer single found file into existing destination subdirectory
+        :param f: Found file (root, file name, DirEntry)
+        :param new_path: Full path to destination subdirectory
+        :return: -
+        """
+        original_file = os.path.join(f[0], f[1])
+        original_stat = f[2].stat()
+        # Only files existing before this transfer are compared, as other files found in this transfer
+        # can share name, size and modification time
+        if self._overwrite:
+            directory_lock = self._directory_locks[new_path]
+            new_path = os.path.join(new_path, f[1])
+            with directory_lock:
+                path_lock, users = self._path_locks.get(new_path, (None, 0))
+                if path_lock is None:
+                    path_lock = threading.Lock()
+                self._path_locks[new_path] = (path_lock, users + 1)
+            try:
+                # Files with the same name are written one by one, so the last one wins as a whole
+                with path_lock:
+                    already_transferred = new_path not in self._transferred_paths \
+                        and _is_same_file(new_path, original_stat)
+                    if not already_transferred:
+                        self._transferred_paths.add(new_path)
+                        self._move_or_copy_file(original_file, new_path, original_stat)
+            finally:
+                with directory_lock:
+                    path_lock, users = self._path_locks[new_path]
+                    if users == 1:
+                        del self._path_locks[new_path]
+                    else:
+                        self._path_locks[new_path] = (path_lock, users - 1)
+        else:
+            with self._directory_locks[new_path]:
+                transferred_copy = self._find_transferred_copy(new_path, f[1], original_stat)
+                already_transferred = transferred_copy is not None
+                if already_transferred:
+                    new_path = transferred_copy
+                else:
+                    new_path = self._get_new_filename(destination_directory=new_path, filename=f[1])
+                    self._transferred_paths.add(new_path)
+            if not already_transferred:
+                self._move_or_copy_file(original_file, new_path, original_stat)
+        if already_transferred:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Skip %s, the same file exists in %s", original_file, new_path)
+            with self._lock:
+                self._skipped += 1
+
+    def _move_or_copy_file(self, original_file, new_path, original_stat):
+        """
+        Helper function to move or copy (depending on remove_original_files) file to given path
+        :param original_file: Full path to original file
+        :param new_path: Full path to destination file
+        :param original_stat: Stat result of original file
+        :return: -
+        """
+        if self._remove_original_files:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Move %s to %s", original_file, new_path)
+            if self._same_fs:
+                try:
+                    os.replace(original_file, new_path)
+                    return
+                except OSError as e:
+                    # Subdirectory of source directory can be a mount point of other filesystem
+                    if e.errno != errno.EXDEV:
+                        raise
+            _fastcopy(original_file, new_path, original_stat)
+            # Original file is removed only when its copy is complete
+            copied_size = os.stat(new_path).st_size
+            if copied_size != original_stat.st_size:
+                raise EFSError("{0} not removed, as its copy {1} has {2} of {3} bytes".format(
+                    original_file, new_path, copied_size, original_stat.st_size))
+            os.unlink(original_file)
+        else:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Copy %s to %s", original_file, new_path)
+            _fastcopy(original_file, new_path, original_stat)
+
+    def _get_date_from_file(self, path_to_file, use_exif=True, mtime_ns=None):
         """
         This function is getting date from file. Date comes from EXIF (if use_exif is True)
         or file modification date (if cannot read from EXIF or use_exif is False)
@@ -91,33 +279,71 @@ class EasyFileSorter(object):
         :type path_to_file: string
         :param use_exif: Determine if date should be taken from EXIF
         :type use_exif: bool
+        :param mtime_ns: Already known file modification time in nanoseconds (read from file if None)
+        :type mtime_ns: int
         :return: Date of file
         :rtype: datetime
         """
         if use_exif:
-            f = open(path_to_file, 'rb')
-            tags = exifread.process_file(f)
-            exif_date = None
-            if "EXIF DateTimeOriginal" in tags:
-                exif_date = tags["EXIF DateTimeOriginal"]
-            elif "Image DateTimeOriginal" in tags:
-                exif_date = tags["Image DateTimeOriginal"]
-            elif "Image DateTime" in tags:
-                exif_date = tags["Image DateTime"]
-            elif "EXIF DateTimeDigitized" in tags:
-                exif_date = tags["EXIF DateTimeDigitized"]
-
+            try:
+                exif_date = _read_exif_date(path_to_file)
+            except Exception as e:
+                # Broken file must not stop transfer of other files
+                logger.warning("Unable to read EXIF from %s: %s", path_to_file, e)
+                exif_date = None
             try:
                 return datetime.strptime(str(exif_date), '%Y:%m:%d %H:%M:%S')
             except ValueError as e:
-                 logging.warning("Unable to read date from EXIF or given date is not valid: %s "
-                                 "\nLet's read file modification date." % e.message)
-                 return self._get_date_from_file(path_to_file, False)
+                 logger.warning("Unable to read date from EXIF or given date is not valid: %s "
+                                "\nLet's read file modification date.", e)
+                 return self._get_date_from_file(path_to_file, False, mtime_ns)
 
         else:
+            if mtime_ns is not None:
+                return datetime.fromtimestamp(mtime_ns / 1e9)
             modification_timestamp = os.path.getmtime(path_to_file)
             return datetime.fromtimestamp(modification_timestamp)
 
+    def _get_existing_names(self, destination_directory):
+        """
+        Helper function to get names of files existing in or already chosen for destination subdirectory.
+        Subdirectory is listed only once, then names are taken from cache.
+        :param destination_directory: Full path to destination subdirectory
+        :rtype set
+        :return: Casefolded file names (casefolded to stay on the safe side on case insensitive filesystems)
+        """
+        existing_names = self._existing_names.get(destination_directory)
+        if existing_names is None:
+            with os.scandir(destination_directory) as entries:
+                existing_names = {entry.name.casefold() for entry in entries}
+            self._existing_names[destination_directory] = existing_names
+        return existing_names
+
+    def _find_transferred_copy(self, destination_directory, filename, original_stat):
+        """
+        Helper function to find copy of original file made by previous transfer, stored with original
+        name or with unique name made by _get_new_filename (name_1.ext, name_2.ext, ...)
+        :param destination_directory: Full path to destination subdirectory
+        :param filename: Original file name
+        :param original_stat: Stat result of original file
+        :rtype String
+        :return: Full path to copy of original file or None if there is no such copy
+        """
+        existing_names = self._get_existing_names(destination_directory)
+        candidate_filename = filename
+        stem, extension = None, None
+        counter = 0
+        # Only taken names are checked, so files are compared only in case of name duplication
+        while candidate_filename.casefold() in existing_names:
+            candidate_path = os.path.join(destination_directory, candidate_filename)
+            if candidate_path not in self._transferred_paths and _is_same_file(candidate_path, original_stat):
+                return candidate_path
+            if stem is None:
+                stem, extension = os.path.splitext(filename)
+            counter += 1
+            candidate_filename = "{0}_{1}{2}".format(stem, counter, extension)
+        return None
+
     def _get_new_filename(self, destination_directory, filename):
         """
         Helper function to create unique file name (to omit issue with duplicated files names)
@@ -126,47 +352,275 @@ class EasyFileSorter(object):
         :rtype String
         :return: Unique file name (full path)
         """
-        if os.path.exists(os.path.join(destination_directory, filename)):
-            new_filename = os.path.splitext(filename)[0] + "_1" + os.path.splitext(filename)[1]
-            return self._get_new_filename(destination_directory, new_filename)
-        else:
-            return os.path.join(destination_directory, filename)
+        existing_names = self._get_existing_names(destination_directory)
+        new_filename = filename
+        folded_filename = filename.casefold()
+        if folded_filename in existing_names:
+            # Name is split only once and only when it is duplicated
+            stem, extension = os.path.splitext(filename)
+            counter = 0
+            while folded_filename in existing_names:
+                counter += 1
+                new_filename = "{0}_{1}{2}".format(stem, counter, extension)
+                folded_filename = new_filename.casefold()
+        existing_names.add(folded_filename)
+        return os.path.join(destination_directory, new_filename)
+
+
+def _read_exif_date(path_to_file):
+    """
+    Helper function to read creation date from EXIF. File is memory mapped, so only pages
+    holding EXIF data are read from disk.
+    :param path_to_file: Full path to file
+    :rtype String
+    :return: Date as stored in EXIF or None if date is not found
+    """
+    with open(path_to_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty file cannot be mapped (and has no EXIF)
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            exif_date = _read_exif_date_fast(mm)
+            if exif_date is None:
+                import exifread  # imported only when needed, as it is slow to import
+                mm.seek(0)
+                # Only date tags are needed - skip MakerNote/thumbnail decoding and stop after DateTimeOriginal
+                tags = exifread.process_file(mm, details=False, stop_tag="DateTimeOriginal")
+                exif_date = next((str(tags[tag]) for tag in EXIF_DATE_TAGS if tag in tags), None)
+            return exif_date
+
+
+def _read_exif_date_fast(fp):
+    """
+    Helper function to read creation date directly from EXIF (APP1) segment of JPEG file, without
+    parsing other tags. Date tags are taken in the same order of preference as EXIF_DATE_TAGS.
+    :param fp: File opened in binary mode, positioned at the beginning
+    :rtype String
+    :return: Date as stored in EXIF ("YYYY:MM:DD HH:MM:SS") or None if file is not JPEG or date is not found
+    """
+    if fp.read(2) != b"\xff\xd8":
+        return None
+    try:
+        while True:
+            marker = fp.read(2)
+            while marker == b"\xff\xff":
+                # Fill bytes before marker
+                marker = marker[1:] + fp.read(1)
+            if len(marker) < 2 or marker[0] != 0xFF or marker[1] in (0xD9, 0xDA):
+                # Broken file, end of image or start of image data - no EXIF
+                return None
+            if marker[1] in JPEG_STANDALONE_MARKERS:
+                continue
+            length = struct.unpack(">H", fp.read(2))[0]
+            if marker[1] == 0xE1:
+                segment = fp.read(length - 2)
+                if len(segment) < length - 2:
+                    # Truncated file
+                    return None
+                if segment[:6] == b"Exif\x00\x00":
+                    return _find_date_in_tiff(segment[6:])
+            else:
+                fp.seek(length - 2, os.SEEK_CUR)
+    except (struct.error, IndexError, UnicodeDecodeError, ValueError):
+        # ValueError comes from seeking past the end of memory mapped (truncated) file
+        return None
+
+
+def _find_date_in_tiff(tiff):
+    """
+    Helper function to find creation date in IFD0 and EXIF IFD of TIFF structure (EXIF segment content)
+    :param tiff: TIFF structure
+    :type tiff: bytes
+    :rtype String
+    :return: Date as stored in EXIF or None if date is not found
+    :raise struct.error, IndexError, UnicodeDecodeError if TIFF structure is broken
+    """
+    if tiff[:4] == b"II*\x00":
+        byte_order = "<"
+    elif tiff[:4] == b"MM\x00*":
+        byte_order = ">"
+    else:
+        return None
+
+    def read_ifd(offset):
+        entries = {}
+        count = struct.unpack_from(byte_order + "H", tiff, offset)[0]
+        for entry_offset in range(offset + 2, offset + 2 + 12 * count, 12):
+            tag, tag_type, value_count = struct.unpack_from(byte_order + "HHI", tiff, entry_offset)
+            if tag_type == 2 and tag in TIFF_DATE_TAGS:
+                # ASCII value is stored in entry when it fits into 4 bytes, otherwise entry holds its offset
+                if value_count <= 4:
+                    value_offset = entry_offset + 8
+                else:
+                    value_offset = struct.unpack_from(byte_order + "I", tiff, entry_offset + 8)[0]
+                value = tiff[value_offset:value_offset + value_count]
+                if len(value) < value_count:
+                    raise IndexError("TIFF value out of range")
+                entries[tag] = value.rstrip(b"\x00 ").decode("ascii") or None
+            elif tag == TIFF_TAG_EXIF_IFD:
+                entries[tag] = struct.unpack_from(byte_order + "I", tiff, entry_offset + 8)[0]
+        return entries
+
+    image_tags = read_ifd(struct.unpack_from(byte_order + "I", tiff, 4)[0])
+    exif_tags = {}
+    if TIFF_TAG_EXIF_IFD in image_tags:
+        exif_tags = read_ifd(image_tags[TIFF_TAG_EXIF_IFD])
+    return (exif_tags.get(TIFF_TAG_DATETIME_ORIGINAL) or image_tags.get(TIFF_TAG_DATETIME_ORIGINAL)
+            or image_tags.get(TIFF_TAG_DATETIME) or exif_tags.get(TIFF_TAG_DATETIME_DIGITIZED))
+
+
+def _is_same_file(path, original_stat):
+    """
+    Helper function to check if file at path is a previously transferred copy of original file
+    (has the same size and modification time)
+    :param path: Path to destination file
+    :param original_stat: Stat result of original file
+    :rtype bool
+    :return: True if file at path exists and looks the same as original file
+    """
+    try:
+        destination_stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return (destination_stat.st_size == original_stat.st_size
+            and destination_stat.st_mtime_ns == original_stat.st_mtime_ns)
+
+
+def _get_device(path):
+    """
+    Helper function to get ID of device containing path. If path does not exist yet,
+    device of its nearest existing parent directory is returned.
+    :param path: Path to file or directory
+    :rtype int
+    :return: Device ID
+    """
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except FileNotFoundError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                raise
+            path = parent
+
+
+@lru_cache(maxsize=1024)
+def _date_dir(destination_dir, date):
+    """
+    Helper function to get destination subdirectory (YYYY/YYYY-MM/YYYY-MM-DD) for given date
+    :param destination_dir: Path to destination directory
+    :param date: Date of file
+    :type date: date
+    :rtype String
+    :return: Full path to destination subdirectory
+    """
+    return os.path.join(destination_dir, date.strftime(os.path.join("%Y", "%Y-%m", "%Y-%m-%d")))
+
+
+def _copy_file_content(src_fd, dst_fd, size):
+    """
+    Helper function to copy content between open files. Tries copy_file_range (in-kernel copy, reflink
+    on CoW filesystems), then sendfile and finally plain read/write loop. Every next method continues
+    from current file offsets, so partial copy done by previous method is not repeated.
+    :param src_fd: Source file descriptor
+    :param dst_fd: Destination file descriptor
+    :param size: Expected size of source file
+    :rtype int
+    :return: Number of bytes copied
+    """
+    kernel_copies = []
+    if hasattr(os, "copy_file_range"):
+        kernel_copies.append(lambda: os.copy_file_range(src_fd, dst_fd, KERNEL_COPY_CHUNK_SIZE))
+    # sendfile accepts offset=None (and regular file as output) only on Linux
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        kernel_copies.append(lambda: os.sendfile(dst_fd, src_fd, None, KERNEL_COPY_CHUNK_SIZE))
+    copied = 0
+    for kernel_copy in kernel_copies:
+        try:
+            sent = kernel_copy()
+            while sent:
+                copied += sent
+                sent = kernel_copy()
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_COPY_ERRNOS:
+                raise
+            continue
+        # Some filesystems report end of file without copying anything - then next method is tried
+        if copied or size == 0:
+            return copied
+    buffer = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(src_fd, "rb", buffering=0, closefd=False) as fsrc, \
+            open(dst_fd, "wb", buffering=0, closefd=False) as fdst:
+        while True:
+            read = fsrc.readinto(buffer)
+            if not read:
+                return copied
+            written = 0
+            while written < read:
+                written += fdst.write(view[written:read])
+            copied += read
+
+
+def _fastcopy(src, dst, src_stat=None):
+    """
+    Copies file content, permissions and access/modification times from src to dst
+    (equivalent of shutil.copy2 without extended attributes)
+    :param src: Path to source file
+    :param dst: Path to destination file (not directory)
+    :param src_stat: Already known stat result of source file (read from opened file if None)
+    :raise EFSError if not whole file was copied (incomplete destination file is removed)
+    :return: -
+    """
+    with open(src, "rb", buffering=0) as fsrc, open(dst, "wb", buffering=0) as fdst:
+        src_fd = fsrc.fileno()
+        if src_stat is None:
+            src_stat = os.fstat(src_fd)
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(src_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        copied = _copy_file_content(src_fd, fdst.fileno(), src_stat.st_size)
+    if copied != src_stat.st_size:
+        os.unlink(dst)
+        raise EFSError("Copying {0} to {1} failed: {2} of {3} bytes copied".format(
+            src, dst, copied, src_stat.st_size))
+    os.chmod(dst, stat.S_IMODE(src_stat.st_mode))
+    os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
 
 
 def main():
-    options_parser = OptionParser("usage: %prog [options]")
-    options_parser.add_option("-s", "--src",
-                              dest="src_dir",
-                              type="string",
-                              help="Sort file from given directory",
-                              metavar="SOURCE_DIR")
-    options_parser.add_option("-d", "--dst",
-                              dest="dest_dir",
-                              help="Transfer sorted files into given directory",
-                              type="string",
-                              metavar="DESTINATION_DIR")
-    options_parser.add_option("-r", "--recursive",
-                              action="store_true",
-                              dest="recursive",
-                              help="Find files recursively in source directory")
-    options_parser.add_option("-m", "--move",
-                              action="store_true",
-                              dest="remove_original",
-                              help="Moving files instead of copying. Please make note that original files are removed.")
-    options_parser.add_option("-o", "--overwrite",
-                              action="store_true",
-                              dest="overwrite",
-                              help="Overwrite existing file in case of duplicated filename."
-                                   "If this option is not set: in case of filename's duplication,"
-                                   "file is moved with new unique name.")
-    options_parser.add_option("-x", "--exiff",
-                              action="store_true",
-                              dest="exif",
-                              help="Get creation date from EXIF. If option is set try to get cration date from EXIF."
-                                   "If option is not set (or cannot read creation date from EXIF) "
-                                   "then get file modification date.",
-                              default=False)
-    (options, args) = options_parser.parse_args()
+    options_parser = argparse.ArgumentParser()
+    options_parser.add_argument("-s", "--src",
+                                dest="src_dir",
+                                help="Sort file from given directory",
+                                metavar="SOURCE_DIR")
+    options_parser.add_argument("-d", "--dst",
+                                dest="dest_dir",
+                                help="Transfer sorted files into given directory",
+                                metavar="DESTINATION_DIR")
+    options_parser.add_argument("-r", "--recursive",
+                                action="store_true",
+                                dest="recursive",
+                                help="Find files recursively in source directory")
+    options_parser.add_argument("-m", "--move",
+                                action="store_true",
+                                dest="remove_original",
+                                help="Moving files instead of copying. "
+                                     "Please make note that original files are removed.")
+    options_parser.add_argument("-o", "--overwrite",
+                                action="store_true",
+                                dest="overwrite",
+                                help="Overwrite existing file in case of duplicated filename."
+                                     "If this option is not set: in case of filename's duplication,"
+                                     "file is moved with new unique name.")
+    options_parser.add_argument("-x", "--exiff",
+                                action="store_true",
+                                dest="exif",
+                                help="Get creation date from EXIF. If option is set try to get cration date from EXIF."
+                                     "If option is not set (or cannot read creation date from EXIF) "
+                                     "then get file modification date.",
+                                default=False)
+    options = options_parser.parse_args()
 
     if options.src_dir is None or options.dest_dir is None:
         options_parser.print_help()
@@ -0,0 +1,280 @@
+import errno
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+import EasyFileSorter
+
+
+def build_ifd(byte_order, offset, entries, exif_ifd_offset=None):
+    """
+    Builds TIFF IFD with ASCII entries (and optional EXIF IFD pointer) placed at given offset
+    :param byte_order: "<" or ">"
+    :param offset: Offset of IFD in TIFF structure
+    :param entries: List of (tag, value) - values up to 4 bytes are stored inside entry
+    :param exif_ifd_offset: Offset of EXIF IFD or None
+    :return: IFD with its values
+    """
+    count = len(entries) + (exif_ifd_offset is not None)
+    values_offset = offset + 2 + 12 * count + 4
+    ifd_entries = b""
+    values = b""
+    for tag, value in entries:
+        if len(value) <= 4:
+            ifd_entries += struct.pack(byte_order + "HHI", tag, 2, len(value)) + value.ljust(4, b"\x00")
+        else:
+            ifd_entries += struct.pack(byte_order + "HHII", tag, 2, len(value), values_offset + len(values))
+            values += value
+    if exif_ifd_offset is not None:
+        ifd_entries += struct.pack(byte_order + "HHII", EasyFileSorter.TIFF_TAG_EXIF_IFD, 4, 1, exif_ifd_offset)
+    return struct.pack(byte_order + "H", count) + ifd_entries + struct.pack(byte_order + "I", 0) + values
+
+
+def build_tiff(byte_order, image_entries, exif_entries=None):
+    header = (b"II*\x00" if byte_order == "<" else b"MM\x00*") + struct.pack(byte_order + "I", 8)
+    if exif_entries is None:
+        return header + build_ifd(byte_order, 8, image_entries)
+    exif_ifd_offset = 8 + len(build_ifd(byte_order, 8, image_entries, 0))
+    return (header + build_ifd(byte_order, 8, image_entries, exif_ifd_offset)
+            + build_ifd(byte_order, exif_ifd_offset, exif_entries))
+
+
+def build_segment(marker, content):
+    return b"\xff" + bytes([marker]) + struct.pack(">H", len(content) + 2) + content
+
+
+def build_jpeg(*segments):
+    app0 = build_segment(0xE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00")
+    return b"\xff\xd8" + app0 + b"".join(segments) + build_segment(0xDA, b"\x00" * 10) + b"\xff\xd9"
+
+
+def build_exif_jpeg(tiff):
+    return build_jpeg(build_segment(0xE1, b"Exif\x00\x00" + tiff))
+
+
+DATE_TIME = b"2011:01:01 01:01:01\x00"
+DATE_TIME_ORIGINAL = b"2012:02:02 02:02:02\x00"
+DATE_TIME_DIGITIZED = b"2013:03:03 03:03:03\x00"
+
+
+class ReadExifDateFastTest(unittest.TestCase):
+
+    def read(self, data):
+        return EasyFileSorter._read_exif_date_fast(io.BytesIO(data))
+
+    def test_byte_orders(self):
+        for byte_order in ("<", ">"):
+            tiff = build_tiff(byte_order, [(EasyFileSorter.TIFF_TAG_DATETIME, DATE_TIME)])
+            self.assertEqual(self.read(build_exif_jpeg(tiff)), "2011:01:01 01:01:01")
+
+    def test_preference_order(self):
+        image_entries = [(EasyFileSorter.TIFF_TAG_DATETIME, DATE_TIME),
+                         (EasyFileSorter.TIFF_TAG_DATETIME_ORIGINAL, b"2014:04:04 04:04:04\x00")]
+        exif_entries = [(EasyFileSorter.TIFF_TAG_DATETIME_ORIGINAL, DATE_TIME_ORIGINAL),
+                        (EasyFileSorter.TIFF_TAG_DATETIME_DIGITIZED, DATE_TIME_DIGITIZED)]
+        cases = [
+            (image_entries, exif_entries, "2012:02:02 02:02:02"),
+            (image_entries, exif_entries[1:], "2014:04:04 04:04:04"),
+            (image_entries[:1], exif_entries[1:], "2011:01:01 01:01:01"),
+            ([], exif_entries[1:], "2013:03:03 03:03:03"),
+            ([], [], None),
+        ]
+        for image_tags, exif_tags, expected in cases:
+            tiff = build_tiff("<", image_tags, exif_tags)
+            self.assertEqual(self.read(build_exif_jpeg(tiff)), expected)
+
+    def test_inline_ascii_value(self):
+        tiff = build_tiff(">", [(EasyFileSorter.TIFF_TAG_DATETIME, b"abc\x00")])
+        self.assertEqual(self.read(build_exif_jpeg(tiff)), "abc")
+
+    def test_other_ascii_tags_are_not_decoded(self):
+        image_description = 0x010E
+        make = 0x010F
+        tiff = build_tiff("<", [(image_description, "Zdjęcie z wakacji\x00".encode("utf-8")),
+                                (make, b"Camera\x00"),
+                                (EasyFileSorter.TIFF_TAG_DATETIME, DATE_TIME)])
+        self.assertEqual(self.read(build_exif_jpeg(tiff)), "2011:01:01 01:01:01")
+        # Value pointing outside of EXIF segment
+        tiff = build_tiff("<", [(make, b"Camera\x00"), (EasyFileSorter.TIFF_TAG_DATETIME, DATE_TIME)])
+        # Offset of Make value is stored at bytes 18-21 (header 8, entries count 2, tag/type/count 8)
+        tiff = tiff[:18] + struct.pack("<I", 60000) + tiff[22:]
+        self.assertEqual(self.read(build_exif_jpeg(tiff)), "2011:01:01 01:01:01")
+
+    def test_xmp_segment_before_exif(self):
+        tiff = build_tiff("<", [(EasyFileSorter.TIFF_TAG_DATETIME, DATE_TIME)])
+        data = build_jpeg(build_segment(0xE1, b"http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta/>"),
+                          build_segment(0xE1, b"Exif\x00\x00" + tiff))
+        self.assertEqual(self.read(data), "2011:01:01 01:01:01")
+
+    def test_fill_bytes_before_marker(self):
+        tiff = build_tiff("<", [(EasyFileSorter.TIFF_TAG_DATETIME, DATE_TIME)])
+        data = build_exif_jpeg(tiff)
+        self.assertEqual(self.read(data[:2] + b"\xff\xff" + data[2:]), "2011:01:01 01:01:01")
+
+    def test_not_jpeg(self):
+        self.assertIsNone(self.read(b""))
+        self.assertIsNone(self.read(build_tiff("<", [(EasyFileSorter.TIFF_TAG_DATETIME, DATE_TIME)])))
+
+    def test_truncated_input(self):
+        tiff = build_tiff("<", [(EasyFileSorter.TIFF_TAG_DATETIME, DATE_TIME)],
+                          [(EasyFileSorter.TIFF_TAG_DATETIME_ORIGINAL, DATE_TIME_ORIGINAL)])
+        data = build_exif_jpeg(tiff)
+        for length in range(len(data)):
+            self.assertIn(self.read(data[:length]), (None, "2012:02:02 02:02:02"))
+
+
+class ReadExifDateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data):
+        path = os.path.join(self.directory, "image.jpg")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_exif_date(self):
+        tiff = build_tiff(">", [], [(EasyFileSorter.TIFF_TAG_DATETIME_ORIGINAL, DATE_TIME_ORIGINAL)])
+        self.assertEqual(EasyFileSorter._read_exif_date(self.write(build_exif_jpeg(tiff))), "2012:02:02 02:02:02")
+
+    def test_segment_longer_than_file(self):
+        # Memory mapped file raises ValueError when seeking past its end
+        app0 = build_segment(0xE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00")
+        data = b"\xff\xd8" + app0 + b"\xff\xdb" + struct.pack(">H", 60000) + b"\x00" * 200
+        sorter = EasyFileSorter.EasyFileSorter(self.directory, self.directory)
+        path = self.write(data)
+        self.assertEqual(sorter._get_date_from_file(path, use_exif=True, mtime_ns=10 ** 18),
+                         sorter._get_date_from_file(path, use_exif=False, mtime_ns=10 ** 18))
+
+
+
+class TransferFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.directory, "src")
+        self.destination_dir = os.path.join(self.directory, "dst")
+        os.makedirs(self.source_dir)
+        os.makedirs(self.destination_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, relative_path, data):
+        path = os.path.join(self.source_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        os.utime(path, ns=(10 ** 18, 10 ** 18))
+        return path
+
+    def sort(self, **kwargs):
+        sorter = EasyFileSorter.EasyFileSorter(self.source_dir, self.destination_dir, **kwargs)
+        sorter.scan_directory(recursive=True)
+        sorter.transfer_files()
+        return sorter
+
+    def transferred_files(self):
+        files = {}
+        for root, _, names in os.walk(self.destination_dir):
+            for name in names:
+                with open(os.path.join(root, name), "rb") as f:
+                    files[name] = f.read()
+        return files
+
+    def test_same_named_files_get_numbered_names(self):
+        contents = {b"a", b"bb", b"ccc"}
+        for subdirectory, data in zip(("", "s1", "s2"), sorted(contents)):
+            self.write(os.path.join(subdirectory, "a.jpg"), data)
+        self.sort()
+        files = self.transferred_files()
+        self.assertEqual(set(files), {"a.jpg", "a_1.jpg", "a_2.jpg"})
+        self.assertEqual(set(files.values()), contents)
+
+    def test_second_run_skips_transferred_files(self):
+        self.write("a.jpg", b"a")
+        self.write(os.path.join("sub", "a.jpg"), b"bb")
+        self.write("b.jpg", b"ccc")
+        self.assertEqual(self.sort()._skipped, 0)
+        files = self.transferred_files()
+        self.assertEqual(set(files), {"a.jpg", "a_1.jpg", "b.jpg"})
+        for _ in range(2):
+            # Copy stored as a_1.jpg is recognised too
+            self.assertEqual(self.sort()._skipped, 3)
+            self.assertEqual(self.transferred_files(), files)
+
+    def test_overwrite_last_file_wins_intact(self):
+        for i in range(8):
+            self.write(os.path.join("s{0}".format(i), "a.bin"), bytes([i]) * 10000 * (i + 1))
+        self.sort(overwrite=True, max_workers=16)
+        files = self.transferred_files()
+        self.assertEqual(set(files), {"a.bin"})
+        data = files["a.bin"]
+        self.assertEqual(data, bytes([data[0]]) * 10000 * (data[0] + 1))
+
+    def test_move_across_filesystems(self):
+        original_file = self.write("a.jpg", b"a" * 10000)
+        sorter = EasyFileSorter.EasyFileSorter(self.source_dir, self.destination_dir, remove_original_files=True)
+        sorter._same_fs = False
+        sorter.scan_directory()
+        with mock.patch.object(os, "copy_file_range", return_value=0, create=True):
+            sorter.transfer_files()
+        self.assertFalse(os.path.exists(original_file))
+        self.assertEqual(self.transferred_files(), {"a.jpg": b"a" * 10000})
+
+
+class CopyFileContentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, "source")
+        self.destination = os.path.join(self.directory, "destination")
+        self.data = os.urandom(EasyFileSorter.COPY_BUFFER_SIZE * 3 + 1)
+        with open(self.source, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def copy(self):
+        EasyFileSorter._fastcopy(self.source, self.destination)
+        with open(self.destination, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_copy(self):
+        self.copy()
+
+    def test_copy_file_range_not_supported(self):
+        with mock.patch.object(os, "copy_file_range", side_effect=OSError(errno.EXDEV, "Cross-device link"),
+                               create=True):
+            self.copy()
+
+    def test_copy_file_range_copies_nothing(self):
+        with mock.patch.object(os, "copy_file_range", return_value=0, create=True):
+            self.copy()
+
+    def test_no_kernel_copy(self):
+        with mock.patch.object(os, "copy_file_range", side_effect=OSError(errno.ENOSYS, "Not implemented"),
+                               create=True), \
+                mock.patch.object(os, "sendfile", side_effect=OSError(errno.EINVAL, "Invalid argument"),
+                                  create=True):
+            self.copy()
+
+    def test_incomplete_copy(self):
+        with mock.patch.object(EasyFileSorter, "_copy_file_content", return_value=1):
+            with self.assertRaises(EasyFileSorter.EFSError):
+                EasyFileSorter._fastcopy(self.source, self.destination)
+        self.assertFalse(os.path.exists(self.destination))
+        self.assertTrue(os.path.exists(self.source))
+
+
+if __name__ == '__main__':
+    unittest.main()